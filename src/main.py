@@ -6,10 +6,12 @@ from datetime import datetime
 from PIL import Image
 import io
 import gradio as gr
-from cachetools import cached, TTLCache
+from cachetools import cached, LRUCache, TTLCache
+from threading import Lock
 import cProfile
 import pstats
 import logging
+import math
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -53,9 +55,43 @@ COMPANY_TICKERS = {
     'Pembina Pipeline': 'PBA'
 }
 
+# Default indicator windows, overridable from the UI
+DEFAULT_INDICATOR_PARAMS = {
+    'sma_short': 55,
+    'sma_long': 200,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'rsi_window': 14,
+    'bb_window': 20,
+    'bb_std': 2.0,
+}
+
+# Largest window accepted for any indicator (roughly four years of trading days)
+MAX_INDICATOR_WINDOW = 1000
+
+# UI labels for the indicator parameters
+INDICATOR_PARAM_LABELS = {
+    'sma_short': "SMA Short Window",
+    'sma_long': "SMA Long Window",
+    'macd_fast': "MACD Fast Span",
+    'macd_slow': "MACD Slow Span",
+    'macd_signal': "MACD Signal Span",
+    'rsi_window': "RSI Window",
+    'bb_window': "Bollinger Window",
+    'bb_std': "Bollinger Std Devs",
+}
+
 # Cache with 1-day TTL
 cache = TTLCache(maxsize=100, ttl=86400)
 
+# Indicator graphs keyed by (ticker, data version), same TTL as the data cache
+graph_cache = TTLCache(maxsize=100, ttl=86400)
+graph_cache_lock = Lock()
+
+# Upper bound on memoized intermediates held by each indicator graph
+GRAPH_MAX_NODES = 32
+
 @cached(cache)
 def fetch_historical_data(ticker, start_date, end_date):
     """Fetch historical stock data and market cap from Yahoo Finance."""
@@ -73,6 +109,115 @@ def fetch_historical_data(ticker, start_date, end_date):
         print(f"Error fetching data for {ticker}: {e}")
         return None, 'N/A'
 
+def resolve_indicator_params(params=None):
+    """Merge user parameters over the defaults and validate them."""
+    resolved = dict(DEFAULT_INDICATOR_PARAMS)
+    for name, value in (params or {}).items():
+        if name not in resolved:
+            raise ValueError(f"Unknown indicator parameter: {name}")
+        if value is not None:
+            resolved[name] = value
+    for name, value in resolved.items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Indicator parameter {name} must be a number")
+        if not math.isfinite(value):
+            raise ValueError(f"Indicator parameter {name} must be a finite number")
+        if name == 'bb_std':
+            if value <= 0:
+                raise ValueError("Bollinger standard deviations must be positive")
+            resolved[name] = value
+        else:
+            if value != int(value):
+                raise ValueError(f"Indicator window {name} must be a whole number")
+            if value < 1:
+                raise ValueError(f"Indicator window {name} must be at least 1")
+            if value > MAX_INDICATOR_WINDOW:
+                raise ValueError(f"Indicator window {name} must be at most {MAX_INDICATOR_WINDOW}")
+            resolved[name] = int(value)
+    if resolved['macd_fast'] >= resolved['macd_slow']:
+        raise ValueError("MACD fast span must be smaller than the slow span")
+    return resolved
+
+class IndicatorGraph:
+    """Memoized computation graph of indicator intermediates for one price series.
+
+    Each node is keyed by its operation and parameters, so intermediates such as
+    the 20-day rolling mean (SMA and Bollinger), the 12/26 EWMs (MACD variants)
+    and the close diff (RSI gains and losses) are computed once per data version.
+    Nodes are held in an LRU cache so arbitrary user windows cannot grow it unbounded.
+    """
+
+    def __init__(self, close, max_nodes=GRAPH_MAX_NODES):
+        self.close = close
+        self.nodes = LRUCache(maxsize=max_nodes)
+
+    def _node(self, key, compute):
+        value = self.nodes.get(key)
+        if value is None:
+            value = compute()
+            self.nodes[key] = value
+        return value
+
+    def sma(self, window):
+        return self._node(('sma', window), lambda: self.close.rolling(window).mean())
+
+    def rolling_std(self, window):
+        return self._node(('std', window), lambda: self.close.rolling(window).std())
+
+    def ewm(self, span):
+        return self._node(('ewm', span), lambda: self.close.ewm(span=span, adjust=False).mean())
+
+    def macd(self, fast, slow):
+        return self._node(('macd', fast, slow), lambda: self.ewm(fast) - self.ewm(slow))
+
+    def macd_signal(self, fast, slow, signal):
+        return self._node(
+            ('macd_signal', fast, slow, signal),
+            lambda: self.macd(fast, slow).ewm(span=signal, adjust=False).mean()
+        )
+
+    def delta(self):
+        return self._node(('delta',), lambda: self.close.diff())
+
+    def gain(self):
+        return self._node(('gain',), lambda: self.delta().clip(lower=0))
+
+    def loss(self):
+        return self._node(('loss',), lambda: -self.delta().clip(upper=0))
+
+    def rsi(self, window):
+        def compute():
+            avg_gain = self.gain().ewm(alpha=1/window, min_periods=window).mean()
+            avg_loss = self.loss().ewm(alpha=1/window, min_periods=window).mean()
+            rs = avg_gain / avg_loss
+            return 100 - (100 / (1 + rs))
+        return self._node(('rsi', window), compute)
+
+    def bollinger(self, window, no_of_std):
+        def compute():
+            rolling_mean = self.sma(window)
+            rolling_std = self.rolling_std(window)
+            return rolling_mean + (rolling_std * no_of_std), rolling_mean - (rolling_std * no_of_std)
+        return self._node(('bollinger', window, no_of_std), compute)
+
+def get_indicator_graph(ticker, data):
+    """Return the memoized indicator graph for a ticker's current data.
+
+    Fetched data is already memoized by `cache`, so the DataFrame's identity is
+    its data version; a refetch yields a new object and hence a fresh graph.
+    The entry keeps a reference to the DataFrame so its id cannot be reused
+    while the entry is alive.
+    """
+    key = (ticker, id(data))
+    with graph_cache_lock:
+        entry = graph_cache.get(key)
+        if entry is None or entry[0] is not data:
+            entry = (data, IndicatorGraph(data['Close']))
+            graph_cache[key] = entry
+    return entry[1]
+
 def plot_to_image(plt, title, market_cap):
     """Convert plot to a PIL Image object."""
     plt.title(title, fontsize=FONT_SIZE + 1, pad=40)
@@ -100,60 +245,55 @@ def plot_to_image(plt, title, market_cap):
         plt.close()
         return None
 
-def plot_indicator(data, company_name, ticker, indicator, market_cap):
+def plot_indicator(data, company_name, ticker, indicator, market_cap, params=None):
     """Plot selected technical indicator for a single company."""
     import pandas as pd
     if data is None or (isinstance(data, pd.DataFrame) and data.empty):
         logging.debug(f"No data to plot for {company_name} ({ticker}).")
         return None
-    
+
+    params = resolve_indicator_params(params)
+    graph = get_indicator_graph(ticker, data)
+
     plt.figure(figsize=(10, 6))
-    if indicator == "SMA":
-        sma_55 = data['Close'].rolling(window=55).mean()
-        sma_200 = data['Close'].rolling(window=200).mean()
-        plt.plot(data.index, data['Close'], label='Close')
-        plt.plot(data.index, sma_55, label='55-day SMA')
-        plt.plot(data.index, sma_200, label='200-day SMA')
-        plt.ylabel('Price', fontsize=FONT_SIZE)
-    elif indicator == "MACD":
-        exp1 = data['Close'].ewm(span=12, adjust=False).mean()
-        exp2 = data['Close'].ewm(span=26, adjust=False).mean()
-        macd = exp1 - exp2
-        signal = macd.ewm(span=9, adjust=False).mean()
-        plt.plot(data.index, macd, label='MACD')
-        plt.plot(data.index, signal, label='Signal Line')
-        plt.bar(data.index, macd - signal, label='MACD Histogram')
-        plt.ylabel('MACD', fontsize=FONT_SIZE)
-    elif indicator == "RSI":
-        window_length = 14
-        delta = data['Close'].diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-        avg_gain = gain.ewm(alpha=1/window_length, min_periods=window_length).mean()
-        avg_loss = loss.ewm(alpha=1/window_length, min_periods=window_length).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        plt.plot(data.index, rsi, label='RSI')
-        plt.axhline(70, color='red', linestyle='--', label='Overbought (70)')
-        plt.axhline(30, color='green', linestyle='--', label='Oversold (30)')
-        plt.ylabel('RSI', fontsize=FONT_SIZE)
-    elif indicator == "Bollinger Bands":
-        window = 20
-        no_of_std = 2
-        rolling_mean = data['Close'].rolling(window).mean()
-        rolling_std = data['Close'].rolling(window).std()
-        upper_band = rolling_mean + (rolling_std * no_of_std)
-        lower_band = rolling_mean - (rolling_std * no_of_std)
-        plt.plot(data.index, data['Close'], label='Close Price')
-        plt.plot(data.index, rolling_mean, label='20-day SMA', color='blue')
-        plt.plot(data.index, upper_band, label='Upper Bollinger Band', color='green')
-        plt.plot(data.index, lower_band, label='Lower Bollinger Band', color='red')
-        plt.fill_between(data.index, lower_band, upper_band, color='grey', alpha=0.1)
-        plt.ylabel('Price', fontsize=FONT_SIZE)
+    try:
+        if indicator == "SMA":
+            short_window, long_window = params['sma_short'], params['sma_long']
+            plt.plot(data.index, data['Close'], label='Close')
+            plt.plot(data.index, graph.sma(short_window), label=f'{short_window}-day SMA')
+            plt.plot(data.index, graph.sma(long_window), label=f'{long_window}-day SMA')
+            plt.ylabel('Price', fontsize=FONT_SIZE)
+        elif indicator == "MACD":
+            fast, slow, span = params['macd_fast'], params['macd_slow'], params['macd_signal']
+            macd = graph.macd(fast, slow)
+            signal = graph.macd_signal(fast, slow, span)
+            plt.plot(data.index, macd, label=f'MACD ({fast}/{slow})')
+            plt.plot(data.index, signal, label=f'Signal Line ({span})')
+            plt.bar(data.index, macd - signal, label='MACD Histogram')
+            plt.ylabel('MACD', fontsize=FONT_SIZE)
+        elif indicator == "RSI":
+            window_length = params['rsi_window']
+            plt.plot(data.index, graph.rsi(window_length), label=f'{window_length}-day RSI')
+            plt.axhline(70, color='red', linestyle='--', label='Overbought (70)')
+            plt.axhline(30, color='green', linestyle='--', label='Oversold (30)')
+            plt.ylabel('RSI', fontsize=FONT_SIZE)
+        elif indicator == "Bollinger Bands":
+            window, no_of_std = params['bb_window'], params['bb_std']
+            rolling_mean = graph.sma(window)
+            upper_band, lower_band = graph.bollinger(window, no_of_std)
+            plt.plot(data.index, data['Close'], label='Close Price')
+            plt.plot(data.index, rolling_mean, label=f'{window}-day SMA', color='blue')
+            plt.plot(data.index, upper_band, label=f'Upper Bollinger Band ({no_of_std:g}σ)', color='green')
+            plt.plot(data.index, lower_band, label=f'Lower Bollinger Band ({no_of_std:g}σ)', color='red')
+            plt.fill_between(data.index, lower_band, upper_band, color='grey', alpha=0.1)
+            plt.ylabel('Price', fontsize=FONT_SIZE)
+    except Exception:
+        plt.close()
+        raise
 
     return plot_to_image(plt, f'{company_name} ({ticker}) {indicator}', market_cap)
 
-def plot_indicators(company_names, indicator_types):
+def plot_indicators(company_names, indicator_types, params=None):
     """Plot the selected indicators for the selected companies."""
     import pandas as pd
     images = []
@@ -167,21 +307,21 @@ def plot_indicators(company_names, indicator_types):
 
     try:
         with ThreadPoolExecutor() as executor:
-            # Create futures for each company-indicator combination
+            # Fetch each company once so all its indicators share one DataFrame,
+            # and therefore one indicator graph
             future_to_company = {
                 executor.submit(
                     fetch_historical_data, 
                     COMPANY_TICKERS[company], 
                     START_DATE, 
                     END_DATE
-                ): (company, indicator)
+                ): company
                 for company in company_names
-                for indicator in indicator_types
             }
 
             # Process completed futures
             for future in as_completed(future_to_company):
-                company, indicator = future_to_company[future]
+                company = future_to_company[future]
                 ticker = COMPANY_TICKERS[company]
                 data, market_cap = future.result()
                 
@@ -190,12 +330,13 @@ def plot_indicators(company_names, indicator_types):
                     logging.debug(f"No data available for {ticker}. Skipping.")
                     continue
                     
-                # Generate and store plot
-                image = plot_indicator(data, company, ticker, indicator, market_cap)
-                if image:
-                    images.append(image)
-                    if market_cap not in (None, 'N/A'):
-                        total_market_cap += market_cap
+                # Generate and store plots
+                for indicator in indicator_types:
+                    image = plot_indicator(data, company, ticker, indicator, market_cap, params)
+                    if image:
+                        images.append(image)
+                        if market_cap not in (None, 'N/A'):
+                            total_market_cap += market_cap
 
         # Return appropriate response based on results
         if not images:
@@ -205,7 +346,7 @@ def plot_indicators(company_names, indicator_types):
     except Exception as e:
         return [], str(e), None
     
-def fetch_and_plot(company_names, indicator_types):
+def fetch_and_plot(company_names, indicator_types, params=None):
     """
     Fetch data and plot indicators for given companies
     """
@@ -226,7 +367,7 @@ def fetch_and_plot(company_names, indicator_types):
                 
             data, market_cap = fetch_historical_data(ticker, START_DATE, END_DATE)
             if data is not None and market_cap != 'N/A':
-                image = plot_indicator(data, company, ticker, indicator_types[0], market_cap)
+                image = plot_indicator(data, company, ticker, indicator_types[0], market_cap, params)
                 if image:
                     images.append(image)
                     total_market_cap += market_cap  # Remove the division here
@@ -246,30 +387,43 @@ def select_all_indicators(select_all):
     indicators = ["SMA", "MACD", "RSI", "Bollinger Bands"]
     return indicators if select_all else []
 
+def plot_indicators_from_ui(company_names, indicator_types, *param_values):
+    """Gradio handler: map parameter inputs, given in DEFAULT_INDICATOR_PARAMS order, to names."""
+    params = dict(zip(DEFAULT_INDICATOR_PARAMS, param_values))
+    images, error_message, total_market_cap = plot_indicators(company_names, indicator_types, params)
+    if error_message:
+        return [None] * len(indicator_types), error_message, None
+    return images, "", f"Total Market Cap: ${total_market_cap:.2f} Billion" if total_market_cap else "N/A"
+
 def launch_gradio_app():
     """Launch the Gradio app for interactive plotting."""
     company_choices = list(COMPANY_TICKERS.keys())
     indicators = ["SMA", "MACD", "RSI", "Bollinger Bands"]
 
-    def fetch_and_plot(company_names, indicator_types):
-        images, error_message, total_market_cap = plot_indicators(company_names, indicator_types)
-        if error_message:
-            return [None] * len(indicator_types), error_message, None
-        return images, "", f"Total Market Cap: ${total_market_cap:.2f} Billion" if total_market_cap else "N/A"
-
     with gr.Blocks() as demo:
         company_checkboxgroup = gr.CheckboxGroup(choices=company_choices, label="Select Companies")
         
         select_all_checkbox = gr.Checkbox(label="Select All Indicators", value=False, interactive=True)
         indicator_types_checkboxgroup = gr.CheckboxGroup(choices=indicators, label="Select Technical Indicators")
         select_all_checkbox.change(select_all_indicators, inputs=select_all_checkbox, outputs=indicator_types_checkboxgroup)
+
+        with gr.Accordion("Indicator Parameters", open=False):
+            with gr.Row():
+                param_inputs = {
+                    name: gr.Number(
+                        value=default,
+                        precision=None if name == 'bb_std' else 0,
+                        label=INDICATOR_PARAM_LABELS[name]
+                    )
+                    for name, default in DEFAULT_INDICATOR_PARAMS.items()
+                }
         
         run_button = gr.Button("Plot Indicators")
         plot_gallery = gr.Gallery(label="Indicator Plots")
         error_markdown = gr.Markdown()
         market_cap_text = gr.Markdown()
 
-        run_button.click(fetch_and_plot, inputs=[company_checkboxgroup, indicator_types_checkboxgroup], outputs=[plot_gallery, error_markdown, market_cap_text])
+        run_button.click(plot_indicators_from_ui, inputs=[company_checkboxgroup, indicator_types_checkboxgroup] + list(param_inputs.values()), outputs=[plot_gallery, error_markdown, market_cap_text])
 
     demo.launch()
 
@@ -0,0 +1,171 @@
+import time
+import pytest
+import pandas as pd
+import matplotlib.pyplot as plt
+from unittest.mock import patch
+from src.main import (
+    IndicatorGraph,
+    get_indicator_graph,
+    resolve_indicator_params,
+    plot_indicator,
+    plot_indicators,
+    plot_indicators_from_ui,
+    graph_cache,
+    cache,
+    DEFAULT_INDICATOR_PARAMS,
+)
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    graph_cache.clear()
+    yield
+    cache.clear()
+    graph_cache.clear()
+
+def test_resolve_indicator_params_defaults():
+    assert resolve_indicator_params() == DEFAULT_INDICATOR_PARAMS
+    assert resolve_indicator_params({'sma_short': None}) == DEFAULT_INDICATOR_PARAMS
+
+def test_resolve_indicator_params_overrides():
+    params = resolve_indicator_params({'sma_short': 20.0, 'bb_std': 3})
+    assert params['sma_short'] == 20
+    assert params['bb_std'] == 3.0
+
+def test_resolve_indicator_params_invalid():
+    with pytest.raises(ValueError):
+        resolve_indicator_params({'rsi_window': 0})
+    with pytest.raises(ValueError):
+        resolve_indicator_params({'macd_fast': 26, 'macd_slow': 12})
+    with pytest.raises(ValueError):
+        resolve_indicator_params({'unknown': 5})
+
+@pytest.mark.parametrize('params, message', [
+    ({'sma_short': 20.9}, 'whole number'),
+    ({'bb_std': float('inf')}, 'finite'),
+    ({'rsi_window': float('nan')}, 'finite'),
+    ({'bb_window': 'abc'}, 'must be a number'),
+    ({'sma_long': 10**20}, 'at most'),
+    ({'rsi_window': 10**400}, 'must be a number'),
+])
+def test_resolve_indicator_params_rejects_bad_values(params, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_indicator_params(params)
+
+def test_indicator_graph_matches_direct_computation(sample_data):
+    close = sample_data['Close']
+    graph = IndicatorGraph(close)
+
+    assert graph.sma(20).equals(close.rolling(20).mean())
+    exp1 = close.ewm(span=12, adjust=False).mean()
+    exp2 = close.ewm(span=26, adjust=False).mean()
+    assert graph.macd(12, 26).equals(exp1 - exp2)
+    upper, lower = graph.bollinger(20, 2.0)
+    assert upper.equals(close.rolling(20).mean() + close.rolling(20).std() * 2.0)
+
+def test_indicator_graph_shares_intermediates(sample_data):
+    graph = IndicatorGraph(sample_data['Close'])
+    sma_20 = graph.sma(20)
+    graph.bollinger(20, 2.0)
+    graph.bollinger(20, 3.0)
+    graph.macd_signal(12, 26, 9)
+    graph.macd_signal(12, 26, 5)
+    graph.rsi(14)
+    graph.rsi(7)
+
+    assert graph.sma(20) is sma_20
+    assert sum(1 for key in graph.nodes if key[0] == 'sma') == 1
+    assert sum(1 for key in graph.nodes if key[0] == 'ewm') == 2
+    assert sum(1 for key in graph.nodes if key[0] == 'macd') == 1
+    assert sum(1 for key in graph.nodes if key[0] == 'delta') == 1
+
+def test_get_indicator_graph_memoized_per_data_version(sample_data):
+    graph = get_indicator_graph('EPD', sample_data)
+    assert get_indicator_graph('EPD', sample_data) is graph
+    assert get_indicator_graph('KMI', sample_data) is not graph
+
+    refetched = sample_data.copy()
+    assert get_indicator_graph('EPD', refetched) is not graph
+
+def test_plot_indicator_custom_params(sample_data):
+    params = {'bb_window': 10, 'bb_std': 1.5}
+    image = plot_indicator(sample_data, 'Enterprise Products Partners', 'EPD', 'Bollinger Bands', 150.0, params)
+
+    assert image is not None
+    assert image.format == 'PNG'
+
+def test_indicator_graph_node_store_is_bounded(sample_data):
+    graph = IndicatorGraph(sample_data['Close'], max_nodes=8)
+    for window in range(1, 50):
+        graph.sma(window)
+
+    assert len(graph.nodes) == 8
+    assert ('sma', 49) in graph.nodes
+    assert ('sma', 1) not in graph.nodes
+
+@patch('src.main.plot_indicators')
+def test_plot_indicators_from_ui_forwards_named_params(mock_plot_indicators):
+    mock_plot_indicators.return_value = (['image'], "", 150.0)
+    values = [10, 50, 5, 35, 7, 21, 30, 2.5]
+
+    images, error_message, market_cap_text = plot_indicators_from_ui(['Kinder Morgan'], ['RSI'], *values)
+
+    mock_plot_indicators.assert_called_once_with(['Kinder Morgan'], ['RSI'], {
+        'sma_short': 10,
+        'sma_long': 50,
+        'macd_fast': 5,
+        'macd_slow': 35,
+        'macd_signal': 7,
+        'rsi_window': 21,
+        'bb_window': 30,
+        'bb_std': 2.5,
+    })
+    assert images == ['image']
+    assert error_message == ""
+    assert market_cap_text == "Total Market Cap: $150.00 Billion"
+
+def test_plot_indicators_surfaces_invalid_params(mock_yf_download, mock_yf_info):
+    images, error_message, total_market_cap = plot_indicators(
+        ['Enterprise Products Partners'], ['MACD'], {'macd_fast': 26, 'macd_slow': 12}
+    )
+
+    assert images == []
+    assert error_message == "MACD fast span must be smaller than the slow span"
+    assert total_market_cap is None
+
+def test_plot_indicators_shares_one_graph_per_ticker(mock_yf_info, sample_data):
+    rolling_windows = []
+    original_rolling = pd.Series.rolling
+
+    def counting_rolling(self, window, *args, **kwargs):
+        rolling_windows.append(window)
+        return original_rolling(self, window, *args, **kwargs)
+
+    def slow_download(*args, **kwargs):
+        # Slow enough that concurrent fetches for one ticker would all miss the cache
+        time.sleep(0.05)
+        return sample_data.copy()
+
+    with patch('src.main.yf.download', side_effect=slow_download) as mock_download, \
+            patch.object(pd.Series, 'rolling', counting_rolling):
+        images, error_message, _ = plot_indicators(
+            ['Enterprise Products Partners'],
+            ['SMA', 'MACD', 'RSI', 'Bollinger Bands'],
+            {'sma_short': 20}
+        )
+
+    assert len(images) == 4
+    assert error_message == ""
+    assert mock_download.call_count == 1
+    assert len(graph_cache) == 1
+    # 20-day mean shared by SMA and Bollinger, plus the 200-day mean and 20-day std
+    assert sorted(rolling_windows) == [20, 20, 200]
+
+def test_plot_indicator_closes_figure_on_failure(sample_data):
+    open_figures = len(plt.get_fignums())
+
+    with patch.object(IndicatorGraph, 'sma', side_effect=OverflowError("too large")):
+        with pytest.raises(OverflowError):
+            plot_indicator(sample_data, 'Enterprise Products Partners', 'EPD', 'SMA', 150.0)
+
+    assert len(plt.get_fignums()) == open_figures